@@ -1,4 +1,4 @@
-#!/usr/bin/python -u
+#!/usr/bin/python3 -u
 ## The -u option above turns off block buffering of python output. This assures
 ## that each error message gets individually printed to the log file.
 #
@@ -50,7 +50,7 @@ def createRrdFile():
     """
 
     if os.path.exists(_RRD_FILE):
-        print "rrdtool radiation database file already exists"
+        print("rrdtool radiation database file already exists")
         return True
 
      ## Calculate database size
@@ -61,21 +61,20 @@ def createRrdFile():
     rrd24hrNumRows = int(round(86400 / _DATABASE_UPDATE_INTERVAL))
     rrd1yearNumRows = _1YR_RRA_STEPS_PER_DAY * _RRD_SIZE_IN_DAYS
        
-    strFmt = ("rrdtool create %s --step %s "
-               "DS:CPM:GAUGE:%s:U:U DS:SvperHr:GAUGE:%s:U:U "
-               "RRA:LAST:0.5:1:%s RRA:LAST:0.5:%s:%s")
+    lCmd = ["rrdtool", "create", _RRD_FILE,
+            "--step", str(_DATABASE_UPDATE_INTERVAL),
+            "DS:CPM:GAUGE:%s:U:U" % heartBeat,
+            "DS:SvperHr:GAUGE:%s:U:U" % heartBeat,
+            "RRA:LAST:0.5:1:%s" % rrd24hrNumRows,
+            "RRA:LAST:0.5:%s:%s" % (rra1yrNumPDP, rrd1yearNumRows)]
 
-    strCmd = strFmt % (_RRD_FILE, _DATABASE_UPDATE_INTERVAL, \
-                heartBeat, heartBeat, rrd24hrNumRows, rra1yrNumPDP, rrd1yearNumRows)
+    print("creating rrdtool radiation database...\n\n%s\n" % " ".join(lCmd))
 
-    print "creating rrdtool radiation database...\n\n%s\n" % strCmd
-
-    # Spawn a sub-shell and run the command
+    # Run rrdtool directly, without spawning a sub-shell
     try:
-        subprocess.check_output(strCmd, stderr=subprocess.STDOUT, \
-                                shell=True)
-    except subprocess.CalledProcessError, exError:
-        print "rrdtool create failed: %s" % (exError.output)
+        subprocess.check_call(lCmd)
+    except subprocess.CalledProcessError as exError:
+        print("rrdtool create failed: %s" % (exError))
         return False
     return True
 ##end def
@@ -44,11 +44,14 @@
 import os
 import sys
 import signal
-import multiprocessing
+import argparse
+import selectors
 import time
 import calendar
+import re
 import json
-from urllib.request import urlopen
+import http.client
+from urllib.parse import urlsplit
 import rrdbase
 
    ### ENVIRONMENT ###
@@ -56,6 +59,9 @@ import rrdbase
 _USER = os.environ['USER']
 _SERVER_MODE = "primary"
 _USE_RADMON_TIMESTAMP = True
+# address of an rrdtool caching daemon, for example
+# "unix:/var/run/rrdcached.sock", or empty to access the database directly
+_RRDCACHED_ADDRESS = ""
 
    ### DEFAULT RADIATION MONITOR URL ###
 
@@ -70,6 +76,8 @@ _DOCROOT_PATH = "/home/%s/public_html/radmon/" % _USER
 _CHARTS_DIRECTORY = _DOCROOT_PATH + "dynamic/"
 # location of data output file
 _OUTPUT_DATA_FILE = _DOCROOT_PATH + "dynamic/radmonData.js"
+# temporary file for writing the data output file
+_OUTPUT_TEMP_FILE = _OUTPUT_DATA_FILE + ".tmp"
 # database that stores radmon data
 _RRD_FILE = "/home/%s/database/radmonData.rrd" % _USER
 
@@ -79,21 +87,61 @@ _RRD_FILE = "/home/%s/database/radmonData.rrd" % _USER
 _MAX_FAILED_DATA_REQUESTS = 2
 # maximum number of http request retries  allowed
 _MAX_HTTP_RETRIES = 5
-# delay time between http request retries
-_HTTP_RETRY_DELAY = 1.119
+# delay time before the first http request retry; the delay doubles
+# with each further retry, up to the maximum delay
+_HTTP_RETRY_DELAY = 0.1
+_HTTP_MAX_RETRY_DELAY = 1.0
 # interval in seconds between data requests
 _DEFAULT_DATA_REQUEST_INTERVAL = 5
+# default maximum interval in seconds between data requests, while
+# the radiation monitor fails to respond
+_DEFAULT_MAX_DATA_REQUEST_INTERVAL = 60
 # number seconds to wait for a response to HTTP request
 _HTTP_REQUEST_TIMEOUT = 3
+# size in bytes of the buffer for receiving HTTP responses
+_HTTP_RESPONSE_BUFFER_SIZE = 512
+# interval in seconds between repeats of the same error message
+_ERROR_REPEAT_INTERVAL = 3600
 
 # interval in seconds between database updates
 _DATABASE_UPDATE_INTERVAL = 30
+# number of database updates collected and then written to the database
+# at once; charts get generated only from written data, so any waiting
+# updates get written before the charts are generated.  Samples waiting
+# to be written are lost if the agent gets killed, so only collect
+# samples when updates go to the rrdtool caching daemon, which holds
+# them in memory anyway.
+_DATABASE_UPDATE_BATCH_SIZE = 1
 # interval in seconds between chart updates
 _CHART_UPDATE_INTERVAL = 300
 # standard chart width in pixels
 _CHART_WIDTH = 600
 # standard chart height in pixels
 _CHART_HEIGHT = 150
+# format of the data string returned by the radiation monitor
+_DATA_STRING_REGEX = re.compile( \
+    r"\$,UTC=([^,]*),CPS=([^,]*),CPM=([^,]*),uSv/hr=([^,]*),Mode=([^,]*),#")
+# charts generated at the chart update interval: file name, data item,
+# ordinate label, chart title, start time of the charted data, and the
+# minimum time in seconds between regenerations of the chart.  Charts
+# of long periods barely change from one chart update to the next, so
+# they get regenerated less often.
+_CHARTS = (
+    # past 24 hours
+    ('24hr_cpm', 'CPM', 'counts per minute', 'CPM - Last 24 Hours',
+     'end-1day', 0),
+    ('24hr_svperhr', 'SvperHr', 'Sv per hour', 'Sv/Hr - Last 24 Hours',
+     'end-1day', 0),
+    # past 4 weeks
+    ('4wk_cpm', 'CPM', 'counts per minute', 'CPM - Last 4 Weeks',
+     'end-4weeks', 1800),
+    ('4wk_svperhr', 'SvperHr', 'Sv per hour', 'Sv/Hr - Last 4 Weeks',
+     'end-4weeks', 1800),
+    # past year
+    ('12m_cpm', 'CPM', 'counts per minute', 'CPM - Past Year',
+     'end-12months', 21600),
+    ('12m_svperhr', 'SvperHr', 'Sv per hour', 'Sv/Hr - Past Year',
+     'end-12months', 21600) )
 
    ### GLOBAL VARIABLES ###
 
@@ -106,28 +154,111 @@ reportUpdateFails = False
 # and radiation monitor online or offline status.
 # count of failed attempts to get data from radiation monitor
 failedUpdateCount = 0
-httpRetries = 0
 radmonOnline = False
 
 # status of reset command to radiation monitor
 remoteDeviceReset = False
 # ip address of radiation monitor
 radiationMonitorUrl = _DEFAULT_RADIATION_MONITOR_URL
+# persistent http connection to the radiation monitor
+httpConnection = None
+# path prefix, if any, of the radiation monitor url
+httpPath = ""
+# buffer reused for receiving every radiation monitor response
+httpResponseBuffer = bytearray(_HTTP_RESPONSE_BUFFER_SIZE)
 # web update frequency
 dataRequestInterval = _DEFAULT_DATA_REQUEST_INTERVAL
+# maximum web update interval, after repeated failed data requests
+maxDataRequestInterval = _DEFAULT_MAX_DATA_REQUEST_INTERVAL
+# current web update interval, lengthened after failed data requests
+currentRequestInterval = _DEFAULT_DATA_REQUEST_INTERVAL
 
 # rrdtool database interface handler
 rrdb = None
+# rrdtool interface handler for rendering charts
+chartRrdb = None
+# time stamp of the newest sample shown in the last charts generated
+chartDataTime = None
+# monotonic times at which each chart was last regenerated
+chartRenderTimes = {}
+
+# contents last written to the output data file
+outputData = None
+
+# cached log message time stamp and the second it was formatted for
+timeStamp = ""
+timeStampSecond = 0
+
+# set when the agent process has been asked to stop
+terminateRequested = False
+# read end of the pipe the signal handler wakes the main loop through
+wakeupReader = None
+
+# last error message printed, when it was printed, and the number of
+# times it has since recurred without being printed
+lastErrorMessage = ""
+lastErrorTime = 0.0
+errorRepeatCount = 0
 
   ###  PRIVATE METHODS  ###
 
 def getTimeStamp():
     """
     Set the error message time stamp to the local system time.
+    The formatted time stamp gets cached, so it is only formatted
+    once per second no matter how often it is requested.
     Parameters: none
     Returns: string containing the time stamp
     """
-    return time.strftime( "%m/%d/%Y %T", time.localtime() )
+    global timeStampSecond, timeStamp
+
+    now = int(time.time())
+    if now != timeStampSecond:
+        timeStampSecond = now
+        timeStamp = time.strftime( "%m/%d/%Y %T", time.localtime(now) )
+    return timeStamp
+## end def
+
+def printError(sMessage):
+    """Print an error message, preceded by a time stamp, to the log.
+       While the same error keeps recurring, for instance while the
+       radiation monitor sends corrupted data, the message gets printed
+       only once per repeat interval.  The number of repeats not printed
+       gets reported when the message is next printed.
+       Parameters:
+           sMessage - the error message
+       Returns: nothing
+    """
+    global lastErrorMessage, lastErrorTime, errorRepeatCount
+
+    currentTime = time.monotonic()
+    if sMessage == lastErrorMessage and \
+       currentTime - lastErrorTime < _ERROR_REPEAT_INTERVAL:
+        errorRepeatCount += 1
+        return
+
+    if errorRepeatCount > 0:
+        print("%s last error repeated %d times" % \
+              (getTimeStamp(), errorRepeatCount))
+    print("%s %s" % (getTimeStamp(), sMessage))
+    lastErrorMessage = sMessage
+    lastErrorTime = currentTime
+    errorRepeatCount = 0
+## end def
+
+def removeOutputFile():
+    """Remove the output data file.
+       Parameters: none
+       Returns: nothing
+    """
+    global outputData
+
+    # The file must get written again by the next successful update.
+    outputData = None
+    try:
+        os.unlink(_OUTPUT_DATA_FILE)
+    except FileNotFoundError:
+        pass
 ## end def
 
 def setStatusToOffline():
@@ -140,8 +271,7 @@ def setStatusToOffline():
     global radmonOnline
 
     # Inform downstream clients by removing output data file.
-    if os.path.exists(_OUTPUT_DATA_FILE):
-       os.remove(_OUTPUT_DATA_FILE)
+    removeOutputFile()
     # If the radiation monitor was previously online, then send
     # a message that we are now offline.
     if radmonOnline:
@@ -150,19 +280,76 @@ def setStatusToOffline():
 ## end def
 
 def terminateAgentProcess(signal, frame):
-    """Send a message to log when the agent process gets killed
-       by the operating system.  Inform downstream clients
-       by removing input and output data files.
+    """Request the agent process to stop, when the process gets
+       killed by the operating system.  The agent stops once the main
+       loop has finished its current pass, so that the signal does not
+       interrupt an exchange with rrdtool that is under way.
        Parameters:
            signal, frame - dummy parameters
        Returns: nothing
     """
+    global terminateRequested
+
+    terminateRequested = True
+## end def
+
+def stopAgentProcess():
+    """Send a message to log when the agent process stops.  Inform
+       downstream clients by removing input and output data files.
+       Parameters: none
+       Returns: nothing
+    """
     # Inform downstream clients by removing output data file.
-    if os.path.exists(_OUTPUT_DATA_FILE):
-       os.remove(_OUTPUT_DATA_FILE)
+    removeOutputFile()
+    # Let the rrdtool processes finish and exit.
+    for rrdInterface in (rrdb, chartRrdb):
+        if rrdInterface is not None:
+            rrdInterface.close()
     print('%s terminating radmon agent process' % \
               (getTimeStamp()))
-    sys.exit(0)
+## end def
+
+def openHttpConnection():
+    """Create the http connection to the radiation monitor.  The url
+       only gets parsed here, and the connection object gets reused
+       for all subsequent data requests.  If the radiation monitor keeps
+       the connection alive, the TCP handshake is avoided as well;
+       otherwise the connection gets re-opened on the next request.
+       Parameters: none
+       Returns: nothing
+    """
+    global httpConnection, httpPath
+
+    urlParts = urlsplit(radiationMonitorUrl)
+    if urlParts.scheme == 'https':
+        httpConnection = http.client.HTTPSConnection(urlParts.netloc, \
+                             timeout=_HTTP_REQUEST_TIMEOUT)
+    else:
+        httpConnection = http.client.HTTPConnection(urlParts.netloc, \
+                             timeout=_HTTP_REQUEST_TIMEOUT)
+    httpPath = urlParts.path.rstrip('/')
+## end def
+
+def sendHttpRequest(sPath):
+    """Send a GET request to the radiation monitor over the persistent
+       http connection.  If the connection was kept open from a previous
+       request, the device may have closed it in the meantime.  In that
+       case the request gets sent again at once on a new connection,
+       rather than counted as a failed request.
+       Parameters:
+           sPath - the path of the requested resource
+       Returns: the http response object
+    """
+    reusedConnection = httpConnection.sock is not None
+    try:
+        httpConnection.request('GET', sPath)
+        return httpConnection.getresponse()
+    except (ConnectionResetError, BrokenPipeError):
+        if not reusedConnection:
+            raise
+    httpConnection.close()
+    httpConnection.request('GET', sPath)
+    return httpConnection.getresponse()
 ## end def
 
   ###  PUBLIC METHODS  ###
@@ -170,63 +357,72 @@ def terminateAgentProcess(signal, frame):
 def getRadiationData(dData):
     """Send http request to radiation monitoring device.  The
        response from the device contains the radiation data as
-       unformatted ascii text.
-       Parameters: none 
-       Returns: a string containing the radiation data if successful,
-                or None if not successful
+       unformatted ascii text.  Failed requests get retried up to
+       _MAX_HTTP_RETRIES times.
+       Parameters:
+           dData - a dictionary object to contain the data string
+       Returns: True if successful, False otherwise
     """
-    global httpRetries
-
-    sUrl = radiationMonitorUrl
+    sPath = httpPath
     if remoteDeviceReset:
-        sUrl += "/reset" # reboot the radiation monitor
+        sPath += "/reset" # reboot the radiation monitor
     else:
-        sUrl += "/rdata" # request data from the monitor
-
-    try:
-        currentTime = time.time()
-        response = urlopen(sUrl, timeout=_HTTP_REQUEST_TIMEOUT)
-        requestTime = time.time() - currentTime
-
-        content = response.read().decode('utf-8')
-        content = content.replace('\n', '')
-        content = content.replace('\r', '')
-        if content == "":
-            raise Exception("empty response")
-
-    except Exception as exError:
-        # If no response is received from the device, then assume that
-        # the device is down or unavailable over the network.  In
-        # that case return None to the calling function.
-        httpRetries += 1
-
-        if reportUpdateFails:
-            print("%s " % getTimeStamp(), end='')
-        if reportUpdateFails or verboseMode:
-            print("http request failed (%d): %s" % \
-                (httpRetries, exError))
-
-        if httpRetries > _MAX_HTTP_RETRIES:
-            httpRetries = 0
-            return False
-        else:
-            time.sleep(_HTTP_RETRY_DELAY)
-            return getRadiationData(dData)
-    ## end try
+        sPath += "/rdata" # request data from the monitor
+
+    for attempt in range(1, _MAX_HTTP_RETRIES + 2):
+        try:
+            currentTime = time.monotonic()
+            response = sendHttpRequest(sPath)
+            # Read the response straight into the receive buffer.
+            nBytes = response.readinto(httpResponseBuffer)
+            requestTime = time.monotonic() - currentTime
+
+            if response.status != 200:
+                raise Exception("http error %d: %s" % \
+                                (response.status, response.reason))
+            if nBytes == len(httpResponseBuffer):
+                raise Exception("response too long")
+
+            # Strip line terminators in a single pass before decoding.
+            content = httpResponseBuffer[:nBytes].translate(None, b'\r\n')
+            content = content.decode('utf-8')
+            if content == "":
+                raise Exception("empty response")
+            break
+
+        except Exception as exError:
+            # If no response is received from the device, then assume
+            # that the device is down or unavailable over the network.
+            # Drop the connection so that the next request starts with
+            # a fresh one.
+            httpConnection.close()
+
+            if reportUpdateFails:
+                print("%s " % getTimeStamp(), end='')
+            if reportUpdateFails or verboseMode:
+                print("http request failed (%d): %s" % \
+                    (attempt, exError))
+
+            if attempt > _MAX_HTTP_RETRIES:
+                return False
+            time.sleep(min(_HTTP_RETRY_DELAY * 2 ** (attempt - 1), \
+                           _HTTP_MAX_RETRY_DELAY))
+        ## end try
+    ## end for
 
     if debugMode:
         print(content)
     if verboseMode:
         print("http request successful: %.4f sec" % requestTime)
     
-    httpRetries = 0
     dData['content'] = content
     return True
 ## end def
 
 def parseDataString(dData):
     """Parse the data string returned by the radiation monitor
-       into its component parts.
+       into its component parts, and convert the individual data
+       items as necessary.
        Parameters:
             dData - a dictionary object to contain the parsed data items
        Returns: True if successful, False otherwise
@@ -234,61 +430,65 @@ def parseDataString(dData):
     # Example radiation monitor data string
     # $,UTC=17:09:33 6/22/2021,CPS=0,CPM=26,uSv/hr=0.14,Mode=SLOW,#
     
-    try:
-        sData = dData.pop('content')
-        lData = sData[2:-2].split(',')
-    except Exception as exError:
-        print("%s parseDataString: %s" % (getTimeStamp(), exError))
+    # Match the whole data string in a single pass.  The match also
+    # verifies that all the expected data items have been received.
+    match = _DATA_STRING_REGEX.match(dData.pop('content'))
+    if match is None:
+        printError("parse failed: corrupted data string")
         return False
+    sUtc, sCps, sCpm, sUSvPerHr, sMode = match.groups()
 
-    # Verfy the expected number of data items have been received.
-    if len(lData) != 5:
-        print("%s parse failed: corrupted data string" % getTimeStamp())
-        return False;
-
-    # Load the parsed data into a dictionary for easy access.
-    for item in lData:
-        if "=" in item:
-            dData[item.split('=')[0]] = item.split('=')[1]
-
-    # Add status to dictionary object
-    dData['status'] = 'online'
-    dData['serverMode'] = _SERVER_MODE
-
-    return True
-## end def
-
-def convertData(dData):
-    """Convert individual radiation data items as necessary.
-       Parameters:
-           dData - a dictionary object containing the radiation data
-       Returns: True if successful, False otherwise
-    """
     try:
         if _USE_RADMON_TIMESTAMP:
             # Convert the UTC timestamp provided by the radiation monitoring
-            # device to epoch local time in seconds.
-            ts_utc = time.strptime(dData['UTC'], "%H:%M:%S %m/%d/%Y")
-            epoch_local_sec = calendar.timegm(ts_utc)
+            # device to epoch local time in seconds.  The time stamp has a
+            # fixed layout, for example "17:09:33 6/22/2021", so splitting
+            # it at its separators parses it much faster than
+            # time.strptime.  The month and day are not zero padded, so
+            # the fields cannot be sliced at fixed positions.
+            sTime, sDate = sUtc.split(' ')
+            hour, minute, second = sTime.split(':')
+            month, day, year = sDate.split('/')
+            epoch_local_sec = calendar.timegm((int(year), int(month), \
+                int(day), int(hour), int(minute), int(second), 0, 0, 0))
+            # The device clock usually agrees with the local clock, in
+            # which case the cached log time stamp is the formatted date.
+            sLocalDate = getTimeStamp()
+            if epoch_local_sec != timeStampSecond:
+                sLocalDate = time.strftime("%m/%d/%Y %T", \
+                                           time.localtime(epoch_local_sec))
         else:
             # Use a timestamp generated by the requesting server (this)
             # instead of the timestamp provided by the radiation monitoring
             # device.  Using the server generated timestamp prevents errors
             # that occur when the radiation monitoring device fails to
             # synchronize with a valid NTP time server.
-            epoch_local_sec = time.time()
-
-        dData['date'] = \
-            time.strftime("%m/%d/%Y %T", time.localtime(epoch_local_sec))      
-        dData['mode'] = dData.pop('Mode').lower()
-        dData['uSvPerHr'] = '%.2f' % float(dData['uSv/hr'])
-        # The rrdtool database stores whole units, so convert uSv to Sv.
-        dData['SvPerHr'] = float(dData.pop('uSv/hr')) * 1.0E-06
+            # The cached log time stamp is this same local time, so it
+            # need not be formatted again.
+            sLocalDate = getTimeStamp()
+            epoch_local_sec = timeStampSecond
+        uSvPerHr = float(sUSvPerHr)
 
     except Exception as exError:
-        print("%s data conversion failed: %s" % (getTimeStamp(), exError))
+        printError("data conversion failed: %s" % exError)
         return False
 
+    # Load the parsed and converted data into the dictionary all at
+    # once.  The epoch time, under 'ELT', is for updating the rrdtool
+    # database and gets removed before the output data file is written.
+    # The rrdtool database stores whole units, so uSv get converted
+    # to Sv.
+    dData.update({ 'UTC': sUtc,
+                   'CPS': sCps,
+                   'CPM': sCpm,
+                   'status': 'online',
+                   'serverMode': _SERVER_MODE,
+                   'ELT': int(epoch_local_sec),
+                   'date': sLocalDate,
+                   'mode': sMode.lower(),
+                   'uSvPerHr': '%.2f' % uSvPerHr,
+                   'SvPerHr': uSvPerHr * 1.0E-06 })
+
     return True
 ## end def
 
@@ -301,28 +501,42 @@ def writeOutputFile(dData):
                    to the output data file
        Returns: True if successful, False otherwise
     """
+    global outputData
+
     # Format the radmon data as string using java script object notation.
-    jsData = json.loads("{}")
     try:
-        for key in dData:
-            jsData.update({key:dData[key]})
-        sData = "[%s]" % json.dumps(jsData)
+        sData = json.dumps([dData], separators=(',', ':'))
     except Exception as exError:
-        print("%s writeOutputFile: %s" % (getTimeStamp(), exError))
+        printError("writeOutputFile: %s" % exError)
         return False
 
     if debugMode:
         print(sData)
 
+    # Skip the write if the file already holds the same data, for
+    # instance when the radiation monitor returns a repeated sample.
+    bData = sData.encode('utf-8')
+    if bData == outputData:
+        return True
+
     # Write the string to the output data file for use by html documents.
+    # The data gets written to a temporary file, which then replaces the
+    # output data file.  The rename is atomic, so html documents never
+    # read a partially written file.
     try:
-        fc = open(_OUTPUT_DATA_FILE, "w")
-        fc.write(sData)
-        fc.close()
+        fd = os.open(_OUTPUT_TEMP_FILE, \
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, bData)
+        finally:
+            os.close(fd)
+        os.replace(_OUTPUT_TEMP_FILE, _OUTPUT_DATA_FILE)
     except Exception as exError:
-        print("%s writeOutputFile: %s" % (getTimeStamp(), exError))
+        printError("writeOutputFile: %s" % exError)
+        outputData = None
         return False
 
+    outputData = bData
     return True
 ## end def
 
@@ -330,15 +544,19 @@ def setRadmonStatus(updateSuccess):
     """Detect if radiation monitor is offline or not available on
        the network. After a set number of attempts to get data
        from the monitor set a flag that the radmon is offline.
+       While data requests keep failing, the interval between
+       requests doubles after each failure, up to the maximum
+       request interval, and gets reset by the next success.
        Parameters:
            updateSuccess - a boolean that is True if data request
                            successful, False otherwise
        Returns: nothing
     """
-    global failedUpdateCount, radmonOnline
+    global failedUpdateCount, radmonOnline, currentRequestInterval
 
     if updateSuccess:
         failedUpdateCount = 0
+        currentRequestInterval = dataRequestInterval
         # Set status and send a message to the log if the device
         # previously offline and is now online.
         if not radmonOnline:
@@ -347,8 +565,10 @@ def setRadmonStatus(updateSuccess):
         return
     else:
         # The last attempt failed, so update the failed attempts
-        # count.
+        # count, and back off from polling the monitor.
         failedUpdateCount += 1
+        currentRequestInterval = min(currentRequestInterval * 2, \
+                                     maxDataRequestInterval)
 
     if failedUpdateCount == _MAX_FAILED_DATA_REQUESTS:
         # Max number of failed data requests, so set
@@ -359,68 +579,108 @@ def setRadmonStatus(updateSuccess):
     ### GRAPH FUNCTIONS ###
 
 def generateGraphs():
-    """Generate graphs for display in html documents.
+    """Generate graphs for display in html documents.  The graph
+       commands get queued to an rrdtool process without waiting for
+       the graphs to be rendered, so the agent is not held up while
+       rrdtool works.
        Parameters: none
        Returns: nothing
     """
-    autoScale = False
+    global chartDataTime
+
+    # If rrdtool is still rendering the previous set of charts, then
+    # skip this set rather than let the queued commands pile up.  If
+    # rrdtool has not finished the charts within a chart update interval,
+    # then it has likely hung, so restart it rather than never
+    # generating charts again.
+    if chartRrdb.pendingResponses > 0:
+        if time.monotonic() - chartRrdb.oldestQueueTime() < \
+           _CHART_UPDATE_INTERVAL:
+            if verboseMode:
+                print("%s previous charts not finished, skipping charts" % \
+                      getTimeStamp())
+            return
+        printError("rrdtool not responding to chart commands, restarting")
+        chartRrdb.restartSession()
+
+    # If no sample has been written to the database since the last
+    # charts were generated, for instance while the radiation monitor
+    # is offline, then new charts would show no new data.
+    if rrdb.lastUpdateTime == chartDataTime:
+        if verboseMode:
+            print("%s no new data, skipping charts" % getTimeStamp())
+        return
+    chartDataTime = rrdb.lastUpdateTime
 
-    # past 24 hours
-    rrdb.createAutoGraph('24hr_cpm', 'CPM', 'counts\ per\ minute', 
-                'CPM\ -\ Last\ 24\ Hours', 'end-1day', 0, 0, 2, autoScale)
-    rrdb.createAutoGraph('24hr_svperhr', 'SvperHr', 'Sv\ per\ hour',
-                'Sv/Hr\ -\ Last\ 24\ Hours', 'end-1day', 0, 0, 2, autoScale)
-    # past 4 weeks
-    rrdb.createAutoGraph('4wk_cpm', 'CPM', 'counts\ per\ minute',
-                'CPM\ -\ Last\ 4\ Weeks', 'end-4weeks', 0, 0, 2, autoScale)
-    rrdb.createAutoGraph('4wk_svperhr', 'SvperHr', 'Sv\ per\ hour',
-                'Sv/Hr\ -\ Last\ 4\ Weeks', 'end-4weeks', 0, 0, 2, autoScale)
-    # past year
-    rrdb.createAutoGraph('12m_cpm', 'CPM', 'counts\ per\ minute',
-                'CPM\ -\ Past\ Year', 'end-12months', 0, 0, 2, autoScale)
-    rrdb.createAutoGraph('12m_svperhr', 'SvperHr', 'Sv\ per\ hour',
-                'Sv/Hr\ -\ Past\ Year', 'end-12months', 0, 0, 2, autoScale)
+    # Write any waiting samples to the database, so that they show up
+    # in the charts.
+    rrdb.flushUpdates()
+
+    autoScale = False
+    queue = True
+    currentTime = time.monotonic()
+
+    for fileName, dataItem, gLabel, gTitle, gStart, minInterval in _CHARTS:
+        # Skip charts regenerated more recently than their minimum
+        # regeneration interval.
+        lastRender = chartRenderTimes.get(fileName)
+        if lastRender is not None and \
+           currentTime - lastRender < minInterval:
+            continue
+        # Only count the chart as regenerated once its command got
+        # queued, so that a failed chart gets retried next time.
+        if chartRrdb.createAutoGraph(fileName, dataItem, gLabel, gTitle, \
+                                     gStart, 0, 0, 2, autoScale, queue):
+            chartRenderTimes[fileName] = currentTime
 ## end def
 
 def getCLarguments():
-    """Get command line arguments.  There are four possible arguments
+    """Get command line arguments.  There are seven possible arguments
           -d turns on debug mode
           -v turns on verbose mode
-          -t sets the radiation device query interval
+          -r turns on reporting of failed data requests
+          -p or -i sets the radiation device query interval, which is
+             also the minimum query interval after failed queries
+          -I sets the maximum query interval after failed queries
           -u sets the url of the radiation monitoring device
        Returns: nothing
     """
     global verboseMode, debugMode, dataRequestInterval, \
+           maxDataRequestInterval, currentRequestInterval, \
            radiationMonitorUrl, reportUpdateFails
 
-    index = 1
-    while index < len(sys.argv):
-        if sys.argv[index] == '-v':
-            verboseMode = True
-        elif sys.argv[index] == '-d':
-            verboseMode = True
-            debugMode = True
-        elif sys.argv[index] == '-r':
-            reportUpdateFails = True
-
-        # Update period and url options
-        elif sys.argv[index] == '-p':
-            try:
-                dataRequestInterval = abs(float(sys.argv[index + 1]))
-            except:
-                print("invalid polling period")
-                exit(-1)
-            index += 1
-        elif sys.argv[index] == '-u':
-            radiationMonitorUrl = sys.argv[index + 1]
-            if radiationMonitorUrl.find('http://') < 0:
-                radiationMonitorUrl = 'http://' + radiationMonitorUrl
-            index += 1
-        else:
-            cmd_name = sys.argv[0].split('/')
-            print("Usage: %s [-d] [-p seconds] [-u url}" % cmd_name[-1])
-            exit(-1)
-        index += 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', action='store_true', help='debug mode')
+    parser.add_argument('-v', action='store_true', help='verbose mode')
+    parser.add_argument('-r', action='store_true', \
+                        help='report failed data requests')
+    parser.add_argument('-p', '-i', type=float, dest='p', \
+                        metavar='seconds', \
+                        help='radiation monitor query interval, and ' \
+                             'minimum query interval after failed queries')
+    parser.add_argument('-I', type=float, metavar='seconds', \
+                        help='maximum query interval after failed queries')
+    parser.add_argument('-u', metavar='url', \
+                        help='url of the radiation monitor')
+    args = parser.parse_args()
+
+    verboseMode = args.v or args.d
+    debugMode = args.d
+    reportUpdateFails = args.r
+
+    # Update period and url options
+    if args.p is not None:
+        dataRequestInterval = abs(args.p)
+    if args.I is not None:
+        maxDataRequestInterval = abs(args.I)
+    # The maximum interval can not be shorter than the query interval.
+    maxDataRequestInterval = max(maxDataRequestInterval, dataRequestInterval)
+    currentRequestInterval = dataRequestInterval
+    if args.u is not None:
+        radiationMonitorUrl = args.u
+        # Default to http if the url does not name a scheme.
+        if '://' not in radiationMonitorUrl:
+            radiationMonitorUrl = 'http://' + radiationMonitorUrl
 ## end def
 
 def setup():
@@ -429,7 +689,7 @@ def setup():
        Parameters: none
        Returns: nothing
     """
-    global rrdb
+    global rrdb, chartRrdb, wakeupReader
 
     ## Get command line arguments.
     getCLarguments()
@@ -445,81 +705,190 @@ def setup():
               'create rrdtool database\n')
         exit(1)
 
+    # Parse the radiation monitor url and create the connection to
+    # the monitor once, for use by all data requests.
+    openHttpConnection()
+
+    # A signal wakes up the main loop through a pipe, so that the loop
+    # stops right away rather than at the end of its wait.
+    wakeupReader, wakeupWriter = os.pipe()
+    os.set_blocking(wakeupReader, False)
+    os.set_blocking(wakeupWriter, False)
+    signal.set_wakeup_fd(wakeupWriter)
     signal.signal(signal.SIGTERM, terminateAgentProcess)
     signal.signal(signal.SIGINT, terminateAgentProcess)
 
+    # If an rrdtool caching daemon is available, then the rrdtool
+    # processes started below send their updates through the daemon,
+    # which keeps the database in memory and writes it in batches.
+    if _RRDCACHED_ADDRESS:
+        os.environ['RRDCACHED_ADDRESS'] = _RRDCACHED_ADDRESS
+
     # Define object for calling rrdtool database functions.
+    # Database updates go straight to the rrdtool caching daemon, if
+    # it listens on a UNIX socket.  Without the daemon every sample gets
+    # written to the database right away.
+    batchSize = _DATABASE_UPDATE_BATCH_SIZE if _RRDCACHED_ADDRESS else 1
     rrdb = rrdbase.rrdbase( _RRD_FILE, _CHARTS_DIRECTORY, _CHART_WIDTH, \
+                            _CHART_HEIGHT, verboseMode, debugMode, \
+                            _RRDCACHED_ADDRESS, batchSize )
+    # Charts get rendered by a separate rrdtool process, so that
+    # database updates need not wait for charts to finish.
+    chartRrdb = rrdbase.rrdbase( _RRD_FILE, _CHARTS_DIRECTORY, _CHART_WIDTH, \
                             _CHART_HEIGHT, verboseMode, debugMode )
 ## end def
 
-def loop():
-     # last time output JSON file updated
-    lastDataRequestTime = -1
-    # last time charts generated
-    lastChartUpdateTime = - 1
-    # last time the rrdtool database updated
-    lastDatabaseUpdateTime = -1
+def waitForEvents(selector, waitTime):
+    """Relinquish processing back to the operating system for the
+       specified time.  While rrdtool is rendering queued charts, wake
+       up whenever it sends a response so the response gets collected
+       right away.  Stop waiting when the agent process is asked to
+       stop.
+       Parameters:
+           selector - selector used to wait on the rrdtool process and
+                      on signals
+           waitTime - time in seconds to wait
+       Returns: nothing
+    """
+    deadline = time.monotonic() + waitTime
+
+    while not terminateRequested:
+        remainingTime = deadline - time.monotonic()
+        if remainingTime <= 0.0:
+            return
+
+        fd = chartRrdb.responseFileno()
+        if fd is not None:
+            selector.register(fd, selectors.EVENT_READ)
+        try:
+            events = selector.select(remainingTime)
+        finally:
+            if fd is not None:
+                selector.unregister(fd)
+        for key, mask in events:
+            if key.fd == wakeupReader:
+                # Empty the pipe written to by signals.
+                try:
+                    while os.read(wakeupReader, 64):
+                        pass
+                except BlockingIOError:
+                    pass
+            else:
+                chartRrdb.readResponses()
+    ## end while
+## end def
 
-    while True:
+def getNextDeadline(deadline, interval, currentTime):
+    """Advance the deadline of a periodic event by one interval.  If
+       the event has fallen more than an interval behind, for instance
+       after the radiation monitor was slow to respond, then the next
+       deadline gets set one interval from now, rather than running
+       the missed events back to back.
+       Parameters:
+           deadline - the deadline of the event that is now due
+           interval - the interval in seconds between events
+           currentTime - the current monotonic time in seconds
+       Returns: the deadline of the next event
+    """
+    deadline += interval
+    if deadline <= currentTime:
+        deadline = currentTime + interval
+    return deadline
+## end def
 
-        currentTime = time.time() # get current time in seconds
+def loop():
+    # selector for waiting on events between updates
+    selector = selectors.DefaultSelector()
+    selector.register(wakeupReader, selectors.EVENT_READ)
+    # functions called on every pass, looked up only once
+    monotonic = time.monotonic
+    readChartResponses = chartRrdb.readResponses
+    # dictionary holding the data items of the current sample, reused
+    # for every sample rather than allocated anew
+    dData = {}
+    # All event times below come from the monotonic clock, so that
+    # the update intervals are not upset when the system clock
+    # gets stepped.  Each event has a fixed deadline, which advances
+    # by the event's interval, so that the updates do not drift.
+    # Initially all events are due at once.
+    currentTime = monotonic()
+     # next time to request data and update output JSON file
+    nextDataRequestTime = currentTime
+    # next time to generate charts
+    nextChartUpdateTime = currentTime
+    # next time to update the rrdtool database
+    nextDatabaseUpdateTime = currentTime
+
+    while not terminateRequested:
+
+        currentTime = monotonic() # get current time in seconds
+
+        # Collect the results of any charts rrdtool has finished.
+        readChartResponses()
 
         # Every data update interval request data from the radiation
         # monitor and process the received data.
-        if currentTime - lastDataRequestTime > dataRequestInterval:
-            lastDataRequestTime = currentTime
-            dData = {}
+        if currentTime >= nextDataRequestTime:
+            dData.clear()
 
             # Get the data string from the device.
             result = getRadiationData(dData)
 
-            # If successful parse the data.
+            # If successful parse and convert the data.
             if result:
                 result = parseDataString(dData)
 
-            # If parsing successful, convert the data.
-            if result:
-                result = convertData(dData)
-
-            # If conversion successful, write data to data files.
+            # If parsing successful, write data to data files.  The
+            # epoch time is only for the database, and is not part of
+            # the output data file.
             if result:
+                sampleTime = dData.pop('ELT')
                 writeOutputFile(dData)
 
-            # At the rrdtool database update interval, update the database.
-            if result and (currentTime - lastDatabaseUpdateTime > \
-                           _DATABASE_UPDATE_INTERVAL):   
-                lastDatabaseUpdateTime = currentTime
-                ## Update the round robin database with the parsed data.
-                result = rrdb.updateDatabase(dData['date'], \
-                             dData['CPM'], dData['SvPerHr'])
-
             # Set the radmon status to online or offline depending on the
-            # success or failure of the above operations.
+            # success or failure of getting the data from the monitor.
             setRadmonStatus(result)
 
+            # At the rrdtool database update interval, update the database.
+            # A failed update gets reported by rrdb, and does not reflect
+            # on the status of the radiation monitor.
+            if result and currentTime >= nextDatabaseUpdateTime:
+                nextDatabaseUpdateTime = getNextDeadline( \
+                    nextDatabaseUpdateTime, _DATABASE_UPDATE_INTERVAL, \
+                    currentTime)
+                ## Update the round robin database with the parsed data.
+                ## Sv per hour gets a fixed precision, not a full float repr.
+                rrdb.updateDatabase(sampleTime, \
+                    dData['CPM'], '%.6e' % dData['SvPerHr'])
+
+            # The status above sets the interval to the next request,
+            # which gets longer while requests keep failing.
+            nextDataRequestTime = getNextDeadline(nextDataRequestTime, \
+                                      currentRequestInterval, currentTime)
 
         # At the chart generation interval, generate charts.
-        if currentTime - lastChartUpdateTime > _CHART_UPDATE_INTERVAL:
-            lastChartUpdateTime = currentTime
-            p = multiprocessing.Process(target=generateGraphs, args=())
-            p.start()
+        if currentTime >= nextChartUpdateTime:
+            nextChartUpdateTime = getNextDeadline(nextChartUpdateTime, \
+                                      _CHART_UPDATE_INTERVAL, currentTime)
+            generateGraphs()
 
         # Relinquish processing back to the operating system until
         # the next update interval.
 
-        elapsedTime = time.time() - currentTime
         if verboseMode:
+            elapsedTime = monotonic() - currentTime
             if result:
                 print("update successful: %6f sec\n"
                       % elapsedTime)
             else:
                 print("update failed: %6f sec\n"
                       % elapsedTime)
-        remainingTime = dataRequestInterval - elapsedTime
+        remainingTime = nextDataRequestTime - monotonic()
         if remainingTime > 0.0:
-            time.sleep(remainingTime)
+            waitForEvents(selector, remainingTime)
     ## end while
+
+    stopAgentProcess()
 ## end def
 
 if __name__ == '__main__':
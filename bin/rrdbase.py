@@ -27,13 +27,28 @@
 #
 #2345678901234567890123456789012345678901234567890123456789012345678901234567890
 
+import os
+import socket
 import subprocess
 import time
 
 class rrdbase:
 
+    # cached error message time stamp and the second it was formatted for,
+    # shared by all instances
+    timeStamp = ''
+    timeStampSecond = 0
+    # most samples kept waiting while the database can not be written,
+    # one day's worth at the radmon database update interval
+    maxPendingUpdates = 2880
+    # most samples sent in a single update command; rrdtool and the
+    # caching daemon only read commands up to a few thousand characters
+    # long, and a sample takes about 30 characters
+    maxUpdateSamples = 100
+
     def __init__(self, rrdFile, chartsDirectory, chartWidth, \
-                 chartHeight, verboseMode, debugMode):
+                 chartHeight, verboseMode, debugMode, daemonAddress='', \
+                 updateBatchSize=1):
         """Initialize instance variables that remain constant throughout
            the life of this object instance.  These items are set by the
            calling module.
@@ -44,6 +59,12 @@ class rrdbase:
              chartHeight - the height of charts  in pixels
              verboseMode - verbose output
              debugMode - full debug output
+             daemonAddress - address of an rrdtool caching daemon, for
+                 example 'unix:/var/run/rrdcached.sock'.  If a UNIX
+                 socket, database updates get sent straight to the
+                 daemon instead of through an rrdtool process.
+             updateBatchSize - the number of samples collected before
+                 they get written to the database in a single update
            Returns: nothing
         """
         self.rrdFile = rrdFile
@@ -52,6 +73,44 @@ class rrdbase:
         self.chartHeight = chartHeight
         self.verboseMode = verboseMode
         self.debugMode = debugMode
+        # leading part of every database update command.  Samples older
+        # than the last update, for instance after the device's clock
+        # was set back, get skipped by rrdtool instead of failing.
+        # rrdtool refuses --skip-past-updates when it sends updates
+        # through a caching daemon, as it does whenever a daemon address
+        # is given and exported as RRDCACHED_ADDRESS, so then the option
+        # gets left out.
+        self.updatePrefix = 'update %s ' % rrdFile
+        if not daemonAddress:
+            self.updatePrefix += '--skip-past-updates '
+        # persistent rrdtool process running in remote control mode
+        self.rrdSession = None
+        # commands queued to, and responses pending from, the rrdtool
+        # process when not waiting for each command to finish
+        self.sendBuffer = b''
+        self.receiveBuffer = b''
+        self.pendingResponses = 0
+        # monotonic times at which the commands still waiting for a
+        # response were queued, oldest first
+        self.queueTimes = []
+        # formatted graph commands, which do not change between charts
+        self.graphCommands = {}
+        # time stamp of the last sample written or waiting to be written
+        # to the database
+        self.lastUpdateTime = 0
+        # samples waiting to be written to the database
+        self.updateBatchSize = updateBatchSize
+        self.pendingUpdates = []
+        # path of the rrdtool caching daemon's UNIX socket, if used
+        self.daemonPath = None
+        if daemonAddress.startswith('unix:'):
+            self.daemonPath = daemonAddress[5:]
+        elif daemonAddress.startswith('/'):
+            self.daemonPath = daemonAddress
+        # connection to the caching daemon, and file object for reading
+        # its responses
+        self.daemonSocket = None
+        self.daemonReader = None
     ## end def
 
     def getTimeStamp():
@@ -59,7 +118,13 @@ class rrdbase:
            Parameters: none
            Returns: string containing the time stamp
         """
-        return time.strftime('%m/%d/%Y %H:%M:%S', time.localtime())
+        # Format the time stamp only once per second.
+        now = int(time.time())
+        if now != rrdbase.timeStampSecond:
+            rrdbase.timeStampSecond = now
+            rrdbase.timeStamp = time.strftime('%m/%d/%Y %H:%M:%S', \
+                                              time.localtime(now))
+        return rrdbase.timeStamp
     ## end def
 
     def getEpochSeconds(sTime):
@@ -80,45 +145,506 @@ class rrdbase:
         return tSeconds
     ## end def
 
+    def formatCommand(lCmd):
+        """Formats a list of rrdtool arguments as a single command line
+           for the rrdtool remote control mode.  Arguments containing
+           spaces get enclosed in quotes.
+           Parameters:
+               lCmd - list of rrdtool command arguments
+           Returns: string containing the command line
+        """
+        lArgs = []
+        for arg in lCmd:
+            if ' ' in arg:
+                quote = '\'' if '"' in arg else '"'
+                arg = quote + arg + quote
+            lArgs.append(arg)
+        return ' '.join(lArgs)
+    ## end def
+
+    def startSession(self):
+        """Starts rrdtool in remote control mode.  The rrdtool process
+           persists across calls, so each command only costs a write to
+           and a read from a pipe, rather than a fork and exec of a new
+           shell and rrdtool process.
+           Parameters: none
+           Returns: True if successful, False otherwise
+        """
+        try:
+            self.rrdSession = subprocess.Popen(['rrdtool', '-'], \
+                                  stdin=subprocess.PIPE, \
+                                  stdout=subprocess.PIPE, \
+                                  stderr=subprocess.STDOUT)
+        except OSError as exError:
+            print('%s rrdtool session failed: %s' % \
+                  (rrdbase.getTimeStamp(), exError))
+            self.rrdSession = None
+            return False
+        return True
+    ## end def
+
+    def stopSession(self):
+        """Stops the persistent rrdtool process, if running.
+           Parameters: none
+           Returns: nothing
+        """
+        if self.rrdSession is None:
+            return
+        try:
+            # Queued commands get written to the pipe without blocking,
+            # so the rest of a partly written command may still be
+            # waiting.  Write it, and any further queued commands, ahead
+            # of the quit command, and wait for the writes to finish.
+            os.set_blocking(self.rrdSession.stdin.fileno(), True)
+            self.rrdSession.stdin.write(self.sendBuffer + b'quit\n')
+            self.rrdSession.stdin.flush()
+            self.rrdSession.wait(timeout=5)
+        except Exception:
+            self.rrdSession.kill()
+            self.rrdSession.wait()
+        self.closeSessionPipes()
+        self.sendBuffer = b''
+    ## end def
+
+    def checkSession(self):
+        """Makes sure the persistent rrdtool process is running, and
+           (re)starts it if not.  Any queued commands and pending
+           responses of a previous rrdtool process are discarded.
+           Parameters: none
+           Returns: True if the rrdtool process is running, False otherwise
+        """
+        if self.rrdSession is not None and self.rrdSession.poll() is None:
+            return True
+        # The rrdtool process died, so release its pipes before starting
+        # a new one.
+        if self.rrdSession is not None:
+            self.closeSessionPipes()
+        self.discardQueued()
+        return self.startSession()
+    ## end def
+
+    def closeSessionPipes(self):
+        """Closes the pipes to an rrdtool process that has exited, and
+           forgets the process.
+           Parameters: none
+           Returns: nothing
+        """
+        for pipe in (self.rrdSession.stdin, self.rrdSession.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                # Data left unsent to the exited process is of no use.
+                pass
+        self.rrdSession = None
+    ## end def
+
+    def discardQueued(self):
+        """Discards the queued commands and pending responses of the
+           rrdtool process.
+           Parameters: none
+           Returns: nothing
+        """
+        self.sendBuffer = b''
+        self.receiveBuffer = b''
+        self.pendingResponses = 0
+        self.queueTimes = []
+    ## end def
+
+    def restartSession(self):
+        """Kills the persistent rrdtool process, for instance when it
+           stopped responding to queued commands, and discards the
+           commands.  A new rrdtool process gets started by the next
+           command.
+           Parameters: none
+           Returns: nothing
+        """
+        if self.rrdSession is not None:
+            self.rrdSession.kill()
+            self.rrdSession.wait()
+            self.closeSessionPipes()
+        self.discardQueued()
+    ## end def
+
+    def oldestQueueTime(self):
+        """Gets the time at which the oldest command still waiting for
+           a response was queued.
+           Parameters: none
+           Returns: the monotonic time in seconds, or None if no
+                    responses are pending
+        """
+        if not self.queueTimes:
+            return None
+        return self.queueTimes[0]
+    ## end def
+
+    def sendCommand(self, strCmd):
+        """Sends a command to the persistent rrdtool process and reads
+           back the response.  The rrdtool process gets (re)started
+           as necessary.
+           Parameters:
+               strCmd - the rrdtool command, without the leading 'rrdtool'
+           Returns: a tuple (result, output) where result is True if
+                    successful, False otherwise, and output is the text
+                    returned by rrdtool
+        """
+        if not self.checkSession():
+            return False, 'rrdtool not available'
+
+        lOutput = []
+        try:
+            self.rrdSession.stdin.write(strCmd.encode('utf-8') + b'\n')
+            self.rrdSession.stdin.flush()
+            # Each response ends with a line starting with either 'OK' or
+            # 'ERROR'.
+            while True:
+                line = self.rrdSession.stdout.readline().decode('utf-8')
+                if line == '':
+                    raise EOFError('rrdtool session closed')
+                if line.startswith('OK'):
+                    return True, ''.join(lOutput)
+                if line.startswith('ERROR'):
+                    return False, line[6:].strip()
+                lOutput.append(line)
+        except (OSError, EOFError) as exError:
+            # The rrdtool process died, so start a new one next time.
+            self.stopSession()
+            return False, str(exError)
+    ## end def
+
+    def queueCommand(self, strCmd):
+        """Queues a command to the persistent rrdtool process without
+           waiting for the response.  Responses get collected later by
+           calling readResponses.  An object used to queue commands
+           should not also be used for sendCommand.
+           Parameters:
+               strCmd - the rrdtool command, without the leading 'rrdtool'
+           Returns: True if successful, False otherwise
+        """
+        if not self.checkSession():
+            return False
+        # Never let the agent block on a full pipe.
+        os.set_blocking(self.rrdSession.stdin.fileno(), False)
+        os.set_blocking(self.rrdSession.stdout.fileno(), False)
+
+        self.sendBuffer += strCmd.encode('utf-8') + b'\n'
+        self.pendingResponses += 1
+        self.queueTimes.append(time.monotonic())
+        return self.sendQueued()
+    ## end def
+
+    def sendQueued(self):
+        """Writes as much of the queued commands to the rrdtool process
+           as the pipe will accept without blocking.
+           Parameters: none
+           Returns: True if successful, False otherwise
+        """
+        try:
+            while self.sendBuffer:
+                nBytes = os.write(self.rrdSession.stdin.fileno(), \
+                                  self.sendBuffer)
+                self.sendBuffer = self.sendBuffer[nBytes:]
+        except BlockingIOError:
+            # The pipe is full, so send the rest later.
+            pass
+        except OSError as exError:
+            print('%s rrdtool session failed: %s' % \
+                  (rrdbase.getTimeStamp(), exError))
+            self.stopSession()
+            self.discardQueued()
+            return False
+        return True
+    ## end def
+
+    def readResponses(self):
+        """Collects, without blocking, whatever responses to queued
+           commands rrdtool has written so far.  Failed commands get
+           reported.
+           Parameters: none
+           Returns: the number of responses still pending
+        """
+        if self.pendingResponses == 0:
+            return 0
+        if not self.sendQueued():
+            return 0
+
+        try:
+            while True:
+                data = os.read(self.rrdSession.stdout.fileno(), 4096)
+                if data == b'':
+                    raise EOFError('rrdtool session closed')
+                self.receiveBuffer += data
+        except BlockingIOError:
+            pass
+        except (OSError, EOFError) as exError:
+            print('%s rrdtool session failed: %s' % \
+                  (rrdbase.getTimeStamp(), exError))
+            self.stopSession()
+            self.discardQueued()
+            return 0
+
+        # Each response ends with a line starting with either 'OK' or
+        # 'ERROR'.  Keep any incomplete last line for next time.
+        lLines = self.receiveBuffer.split(b'\n')
+        self.receiveBuffer = lLines.pop()
+        for line in lLines:
+            line = line.decode('utf-8')
+            if line.startswith('OK'):
+                self.pendingResponses -= 1
+                del self.queueTimes[:1]
+            elif line.startswith('ERROR'):
+                self.pendingResponses -= 1
+                del self.queueTimes[:1]
+                print('%s rrdtool command failed: %s' % \
+                      (rrdbase.getTimeStamp(), line[6:].strip()))
+            elif self.verboseMode:
+                print('rrdtool: %s' % line)
+        return self.pendingResponses
+    ## end def
+
+    def responseFileno(self):
+        """Gets the file descriptor on which rrdtool sends responses to
+           queued commands, for use with select and similar functions.
+           Parameters: none
+           Returns: the file descriptor, or None if no responses are
+                    pending
+        """
+        if self.pendingResponses == 0 or self.rrdSession is None:
+            return None
+        return self.rrdSession.stdout.fileno()
+    ## end def
+
+    def openDaemonSocket(self):
+        """Connects to the rrdtool caching daemon over its UNIX socket.
+           The connection persists across database updates.
+           Parameters: none
+           Returns: True if successful, False otherwise
+        """
+        try:
+            self.daemonSocket = socket.socket(socket.AF_UNIX, \
+                                              socket.SOCK_STREAM)
+            self.daemonSocket.settimeout(5)
+            self.daemonSocket.connect(self.daemonPath)
+        except OSError as exError:
+            print('%s rrdcached connection failed: %s' % \
+                  (rrdbase.getTimeStamp(), exError))
+            self.closeDaemonSocket()
+            return False
+        self.daemonReader = self.daemonSocket.makefile('rb')
+        return True
+    ## end def
+
+    def closeDaemonSocket(self):
+        """Closes the connection to the rrdtool caching daemon, if open.
+           Parameters: none
+           Returns: nothing
+        """
+        if self.daemonReader is not None:
+            self.daemonReader.close()
+            self.daemonReader = None
+        if self.daemonSocket is not None:
+            self.daemonSocket.close()
+            self.daemonSocket = None
+    ## end def
+
+    def close(self):
+        """Writes any waiting samples to the database, then stops the
+           persistent rrdtool process and closes the connection to the
+           rrdtool caching daemon.  Commands already sent to rrdtool get
+           finished before it exits.
+           Parameters: none
+           Returns: nothing
+        """
+        self.flushUpdates()
+        self.stopSession()
+        self.closeDaemonSocket()
+    ## end def
+
+    def exchangeDaemonCommand(self, strCmd):
+        """Sends a command over the open connection to the rrdtool
+           caching daemon and reads back the response.
+           Parameters:
+               strCmd - the rrdcached command
+           Returns: a tuple (status, message) where status is the status
+                    returned by rrdcached, negative on error, and message
+                    is the message returned by rrdcached
+        """
+        self.daemonSocket.sendall(strCmd.encode('utf-8') + b'\n')
+        # The response starts with a status, which is negative on
+        # error, or otherwise the number of lines that follow.
+        line = self.daemonReader.readline().decode('utf-8')
+        if line == '':
+            raise EOFError('rrdcached connection closed')
+        status, _, message = line.partition(' ')
+        status = int(status)
+        for i in range(status):
+            self.daemonReader.readline()
+        return status, message.strip()
+    ## end def
+
+    def sendDaemonCommand(self, strCmd):
+        """Sends a command to the rrdtool caching daemon and reads back
+           the response.  The connection to the daemon gets (re)opened
+           as necessary.
+           Parameters:
+               strCmd - the rrdcached command
+           Returns: a tuple (result, output) where result is True if
+                    successful, False otherwise, and output is the
+                    message returned by rrdcached
+        """
+        reusedSocket = self.daemonSocket is not None
+        if not reusedSocket and not self.openDaemonSocket():
+            return False, 'rrdcached not available'
+
+        try:
+            try:
+                status, message = self.exchangeDaemonCommand(strCmd)
+            except (ConnectionResetError, BrokenPipeError, EOFError):
+                # The daemon may have closed a connection kept open from
+                # an earlier command, for instance when it got restarted.
+                # In that case reconnect once and send the command again.
+                if not reusedSocket:
+                    raise
+                self.closeDaemonSocket()
+                if not self.openDaemonSocket():
+                    return False, 'rrdcached not available'
+                status, message = self.exchangeDaemonCommand(strCmd)
+        except (OSError, EOFError, ValueError) as exError:
+            self.closeDaemonSocket()
+            return False, str(exError)
+
+        return status >= 0, message
+    ## end def
+
     def updateDatabase(self, *tData):
         """Updates the rrdtool round robin database with data supplied in
-           the weather data string.
+           the weather data string.  The samples get collected and
+           written to the database in batches of updateBatchSize.
+           Samples that could not be written get kept and written with
+           the next batch.
            Parameters:
                tData - a tuple object containing the data items to be written
-                       to the rrdtool database
-           Returns: True if successful, False otherwise
+                       to the rrdtool database.  The first item is the
+                       time stamp, either as a date string or as unix
+                       epoch seconds.
+           Returns: True if successful or the sample is waiting for the
+                    rest of the batch, False otherwise
         """
         # Get the time stamp supplied with the data.  This must always be
         # the first element of the tuple argument passed to this function.
-        tData = list(tData)
-        date = tData.pop(0)
-        # Convert the time stamp to unix epoch seconds.
-        try:
-            time = rrdbase.getEpochSeconds(date)
-        # Trap any data conversion errors.
-        except Exception as exError:
-            print('%s updateDatabase error: %s' % \
-                  (rrdbase.getTimeStamp(), exError))
-            return False
+        date, tData = tData[0], tData[1:]
+        # Convert the time stamp to unix epoch seconds, unless already
+        # supplied as epoch seconds.
+        if isinstance(date, int):
+            time = date
+        else:
+            try:
+                time = rrdbase.getEpochSeconds(date)
+            # Trap any data conversion errors.
+            except Exception as exError:
+                print('%s updateDatabase error: %s' % \
+                      (rrdbase.getTimeStamp(), exError))
+                return False
 
-        # Create the rrdtool command for updating the rrdtool database.  Add a
-        # '%s' format specifier for each data item remaining in tData. 
-        # Note that this is the list remaining after the
+        # rrdtool rejects a sample that is not newer than the last one
+        # written, so do not send it to rrdtool at all.  This happens
+        # when the device repeats a sample, or its clock stops.
+        if time <= self.lastUpdateTime:
+            if self.verboseMode:
+                print('database update skipped: sample not newer than ' \
+                      'last update')
+            return True
+
+        # Format the sample for the rrdtool update command.  Add a
+        # ':%s' format specifier for each data item remaining in tData. 
+        # Note that this is the tuple remaining after the
         # first item (the date) has been removed by the above code.
-        strFmt = 'rrdtool update %s %s' + ':%s' * len(tData)
-        strCmd = strFmt % ((self.rrdFile, time,) + tuple(tData))
+        strFmt = '%s' + ':%s' * len(tData)
+        self.pendingUpdates.append(strFmt % ((time,) + tData))
+        self.lastUpdateTime = time
+
+        if len(self.pendingUpdates) < self.updateBatchSize:
+            return True
+        return self.flushUpdates()
+    ## end def
 
+    def sendUpdates(self, lUpdates):
+        """Sends samples to the database in a single update command,
+           straight to the caching daemon, if used, and otherwise to the
+           persistent rrdtool process.
+           Parameters:
+               lUpdates - list of formatted samples
+           Returns: a tuple (result, output) where result is True if
+                    successful, False otherwise, and output is the text
+                    returned by rrdtool or the caching daemon
+        """
+        strData = ' '.join(lUpdates)
+        if self.daemonPath is not None:
+            strCmd = 'UPDATE %s %s' % (self.rrdFile, strData)
+            if self.debugMode:
+                print('%s' % strCmd) # DEBUG
+            return self.sendDaemonCommand(strCmd)
+        strCmd = self.updatePrefix + strData
         if self.debugMode:
             print('%s' % strCmd) # DEBUG
+        return self.sendCommand(strCmd)
+    ## end def
 
-        # Run the formatted command as a subprocess.
-        try:
-            subprocess.check_output(strCmd, stderr=subprocess.STDOUT, \
-                                    shell=True)
-        except subprocess.CalledProcessError as exError:
-            print('%s rrdtool update failed: %s' % \
-                  (rrdbase.getTimeStamp(), exError.output.decode('utf-8')))
-            return False
+    def flushUpdates(self):
+        """Writes the samples waiting to be written to the database.
+           The samples get sent in as few rrdtool update commands as
+           the length limit of a command allows.
+           Parameters: none
+           Returns: True if successful, False otherwise
+        """
+        while self.pendingUpdates:
+            lUpdates = self.pendingUpdates[:rrdbase.maxUpdateSamples]
+            result, output = self.sendUpdates(lUpdates)
+
+            # The caching daemon does not skip samples that are not newer
+            # than the last update, as --skip-past-updates does for
+            # rrdtool.  This happens, for instance, when the daemon
+            # already got the samples before the agent restarted.  The
+            # daemon stops at the first such sample, so any newer samples
+            # in the same update were not written either.  Drop the
+            # samples not newer than the last update time, given in the
+            # daemon's message, for example 'illegal attempt to update
+            # using time 1624381773 when last update time is 1624381800
+            # (minimum one second step)', and send the rest again.
+            if not result and \
+               output.startswith('illegal attempt to update using time'):
+                try:
+                    lastTime = int(output.partition( \
+                        'last update time is ')[2].split(' ')[0])
+                    lNewer = [sample for sample in lUpdates \
+                              if int(sample.partition(':')[0]) > lastTime]
+                except ValueError:
+                    # Without the last update time only a single sample
+                    # is known to be the old one.
+                    lNewer = lUpdates
+                    if len(lUpdates) == 1:
+                        lNewer = []
+                # The samples are in time order, so the old samples are
+                # the leading ones.
+                numOld = len(lUpdates) - len(lNewer)
+                if numOld > 0:
+                    if self.verboseMode:
+                        print('database update skipped %d old samples' % \
+                              numOld)
+                    del self.pendingUpdates[:numOld]
+                    continue
+
+            if not result:
+                print('%s rrdtool update failed: %s' % \
+                      (rrdbase.getTimeStamp(), output))
+                # Keep the samples, so that they get written with the next
+                # update, for instance once the rrdtool process or the
+                # caching daemon is back.  Drop the oldest samples if the
+                # database stays unavailable for too long.
+                del self.pendingUpdates[:-rrdbase.maxPendingUpdates]
+                return False
+
+            # Only forget the samples once they have been written.
+            del self.pendingUpdates[:len(lUpdates)]
 
         if self.verboseMode and not self.debugMode:
             print('database update successful')
@@ -148,76 +674,77 @@ class rrdbase:
         """
         gPath = self.chartsDirectory + fileName + '.png'
 
-        # Format the rrdtool graph command.
+        # Format the rrdtool graph command as an argument list.  Arguments
+        # containing spaces get quoted when the command is sent to rrdtool.
 
         # Set chart start time, height, and width.
-        strCmd = 'rrdtool graph %s -a PNG -s %s -e \'now\' -w %s -h %s ' \
-                 % (gPath, gStart, self.chartWidth, self.chartHeight)
+        lCmd = ['graph', gPath, '-a', 'PNG', '-s', gStart,
+                '-e', 'now', '-w', str(self.chartWidth),
+                '-h', str(self.chartHeight)]
        
         # Set the range and scaling of the chart y-axis.
         if lower < upper:
-            strCmd  +=  '-l %s -u %s -r ' % (lower, upper)
+            lCmd += ['-l', str(lower), '-u', str(upper), '-r']
         elif autoScale:
-            strCmd += '-A '
-        strCmd += '-Y '
+            lCmd.append('-A')
+        lCmd.append('-Y')
 
         # Set the chart ordinate label and chart title. 
-        strCmd += '-v %s -t %s ' % (gLabel, gTitle)
+        lCmd += ['-v', gLabel, '-t', gTitle]
 
         # Show the data, or a moving average trend line, or both.
-        strCmd += 'DEF:dSeries=%s:%s:AVERAGE ' % (self.rrdFile, dataItem)
+        lCmd.append('DEF:dSeries=%s:%s:AVERAGE' % (self.rrdFile, dataItem))
         if addTrend == 0:
-            strCmd += 'LINE1:dSeries#0400ff '
+            lCmd.append('LINE1:dSeries#0400ff')
         elif addTrend == 1:
-            strCmd += 'CDEF:smoothed=dSeries,86400,TREND LINE2:smoothed#006600 '
+            lCmd += ['CDEF:smoothed=dSeries,86400,TREND',
+                     'LINE2:smoothed#006600']
         elif addTrend == 2:
-            strCmd += 'LINE1:dSeries#0400ff '
-            strCmd += 'CDEF:smoothed=dSeries,86400,TREND LINE2:smoothed#006600 '
+            lCmd.append('LINE1:dSeries#0400ff')
+            lCmd += ['CDEF:smoothed=dSeries,86400,TREND',
+                     'LINE2:smoothed#006600']
 
         # if wind plot show color coded wind direction
         if dataItem == 'windspeedmph':
-            strCmd += 'DEF:wDir=%s:winddir:AVERAGE ' % (_RRD_FILE)
-            strCmd += 'VDEF:wMax=dSeries,MAXIMUM '
-            strCmd += 'CDEF:wMaxScaled=dSeries,0,*,wMax,+,-0.15,* '
-            strCmd += 'CDEF:ndir=wDir,337.5,GE,wDir,22.5,LE,+,wMaxScaled,0,IF '
-            strCmd += 'CDEF:nedir=wDir,22.5,GT,wDir,67.5,LT,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:edir=wDir,67.5,GE,wDir,112.5,LE,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:sedir=wDir,112.5,GT,wDir,157.5,LT,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:sdir=wDir,157.5,GE,wDir,202.5,LE,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:swdir=wDir,202.5,GT,wDir,247.5,LT,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:wdir=wDir,247.5,GE,wDir,292.5,LE,*,wMaxScaled,0,IF '
-            strCmd += 'CDEF:nwdir=wDir,292.5,GT,wDir,337.5,LT,*,wMaxScaled,0,IF '
+            lCmd.append('DEF:wDir=%s:winddir:AVERAGE' % (self.rrdFile))
+            lCmd.append('VDEF:wMax=dSeries,MAXIMUM')
+            lCmd.append('CDEF:wMaxScaled=dSeries,0,*,wMax,+,-0.15,*')
+            lCmd.append('CDEF:ndir=wDir,337.5,GE,wDir,22.5,LE,+,wMaxScaled,0,IF')
+            lCmd.append('CDEF:nedir=wDir,22.5,GT,wDir,67.5,LT,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:edir=wDir,67.5,GE,wDir,112.5,LE,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:sedir=wDir,112.5,GT,wDir,157.5,LT,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:sdir=wDir,157.5,GE,wDir,202.5,LE,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:swdir=wDir,202.5,GT,wDir,247.5,LT,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:wdir=wDir,247.5,GE,wDir,292.5,LE,*,wMaxScaled,0,IF')
+            lCmd.append('CDEF:nwdir=wDir,292.5,GT,wDir,337.5,LT,*,wMaxScaled,0,IF')
       
-            strCmd += 'AREA:ndir#0000FF:N '    # Blue
-            strCmd += 'AREA:nedir#1E90FF:NE '  # DodgerBlue
-            strCmd += 'AREA:edir#00FFFF:E '    # Cyan
-            strCmd += 'AREA:sedir#00FF00:SE '  # Lime
-            strCmd += 'AREA:sdir#FFFF00:S '    # Yellow
-            strCmd += 'AREA:swdir#FF8C00:SW '  # DarkOrange 
-            strCmd += 'AREA:wdir#FF0000:W '    # Red
-            strCmd += 'AREA:nwdir#FF00FF:NW '  # Magenta
+            lCmd.append('AREA:ndir#0000FF:N')    # Blue
+            lCmd.append('AREA:nedir#1E90FF:NE')  # DodgerBlue
+            lCmd.append('AREA:edir#00FFFF:E')    # Cyan
+            lCmd.append('AREA:sedir#00FF00:SE')  # Lime
+            lCmd.append('AREA:sdir#FFFF00:S')    # Yellow
+            lCmd.append('AREA:swdir#FF8C00:SW')  # DarkOrange 
+            lCmd.append('AREA:wdir#FF0000:W')    # Red
+            lCmd.append('AREA:nwdir#FF00FF:NW')  # Magenta
         ##end if
         
         if self.debugMode:
-            print('%s' % strCmd) # DEBUG
+            print('%s' % rrdbase.formatCommand(lCmd)) # DEBUG
         
-        # Run the formatted rrdtool command as a subprocess.
-        try:
-            result = subprocess.check_output(strCmd, \
-                         stderr=subprocess.STDOUT,   \
-                         shell=True)
-        except subprocess.CalledProcessError as exError:
-            print('rrdtool graph failed: %s' % (exError.output.decode('utf-8')))
+        # Send the command to the persistent rrdtool process.
+        result, output = self.sendCommand(rrdbase.formatCommand(lCmd))
+        if not result:
+            print('rrdtool graph failed: %s' % output)
             return False
 
         if self.verboseMode:
-            print('rrdtool graph: %s' % result.decode('utf-8')) #, end='')
+            print('rrdtool graph: %s' % output) #, end='')
 
         return True
     ## end def
 
     def createAutoGraph(self, fileName, dataItem, gLabel, gTitle, gStart,
-                    lower, upper, addTrend, autoScale):
+                    lower, upper, addTrend, autoScale, queue=False):
         """Uses rrdtool to create a graph of specified radmon data item.
            Parameters:
                fileName - name of file containing the graph
@@ -233,58 +760,69 @@ class rrdbase:
                autoScale - if True, then use vertical axis auto scaling
                    (lower and upper parameters are ignored), otherwise use
                    lower and upper parameters to set vertical axis scale
+               queue - if True, then queue the graph command to rrdtool
+                   without waiting for the graph to be created
            Returns: True if successful, False otherwise
         """
-        gPath = self.chartsDirectory + fileName + ".png"
-        trendWindow = { 'end-1day': 7200,
-                        'end-4weeks': 172800,
-                        'end-12months': 604800 }
-     
-        # Format the rrdtool graph command.
+        # The graph command depends only on the parameters, so format
+        # it once and reuse it for every later chart of the same kind.
+        key = (fileName, dataItem, gLabel, gTitle, gStart, lower, upper,
+               addTrend, autoScale)
+        strCmd = self.graphCommands.get(key)
+        if strCmd is None:
+            gPath = self.chartsDirectory + fileName + ".png"
+            trendWindow = { 'end-1day': 7200,
+                            'end-4weeks': 172800,
+                            'end-12months': 604800 }
 
-        # Set chart start time, height, and width.
-        strCmd = "rrdtool graph %s -a PNG -s %s -e now -w %s -h %s " \
-                 % (gPath, gStart, self.chartWidth, self.chartHeight)
-       
-        # Set the range and scaling of the chart y-axis.
-        if lower < upper:
-            strCmd  +=  "-l %s -u %s -r " % (lower, upper)
-        elif autoScale:
-            strCmd += "-A "
-        strCmd += "-Y "
+            # Format the rrdtool graph command as an argument list.
+            # Arguments containing spaces get quoted when the command
+            # is sent to rrdtool.
+
+            # Set chart start time, height, and width.
+            lCmd = ['graph', gPath, '-a', 'PNG', '-s', gStart,
+                    '-e', 'now', '-w', str(self.chartWidth),
+                    '-h', str(self.chartHeight)]
+
+            # Set the range and scaling of the chart y-axis.
+            if lower < upper:
+                lCmd += ['-l', str(lower), '-u', str(upper), '-r']
+            elif autoScale:
+                lCmd.append('-A')
+            lCmd.append('-Y')
+
+            # Set the chart ordinate label and chart title. 
+            lCmd += ['-v', gLabel, '-t', gTitle]
+
+            # Show the data, or a moving average trend line over
+            # the data, or both.
+            lCmd.append('DEF:dSeries=%s:%s:LAST' % (self.rrdFile, dataItem))
+            if addTrend == 0:
+                lCmd.append('LINE1:dSeries#0400ff')
+            elif addTrend == 1:
+                lCmd += ['CDEF:smoothed=dSeries,%s,TREND' % \
+                             trendWindow[gStart], 'LINE2:smoothed#006600']
+            elif addTrend == 2:
+                lCmd.append('LINE1:dSeries#0400ff')
+                lCmd += ['CDEF:smoothed=dSeries,%s,TREND' % \
+                             trendWindow[gStart], 'LINE2:smoothed#006600']
+            strCmd = rrdbase.formatCommand(lCmd)
+            self.graphCommands[key] = strCmd
 
-        # Set the chart ordinate label and chart title. 
-        strCmd += "-v %s -t %s " % (gLabel, gTitle)
-     
-        # Show the data, or a moving average trend line over
-        # the data, or both.
-        strCmd += "DEF:dSeries=%s:%s:LAST " % (self.rrdFile, dataItem)
-        if addTrend == 0:
-            strCmd += "LINE1:dSeries#0400ff "
-        elif addTrend == 1:
-            strCmd += "CDEF:smoothed=dSeries,%s,TREND LINE2:smoothed#006600 " \
-                      % trendWindow[gStart]
-        elif addTrend == 2:
-            strCmd += "LINE1:dSeries#0400ff "
-            strCmd += "CDEF:smoothed=dSeries,%s,TREND LINE2:smoothed#006600 " \
-                      % trendWindow[gStart]
-         
         if self.debugMode:
             print("%s" % strCmd) # DEBUG
         
-        # Run the formatted rrdtool command as a subprocess.
-        try:
-            result = subprocess.check_output(strCmd, \
-                         stderr=subprocess.STDOUT,   \
-                         shell=True)
-        except subprocess.CalledProcessError as exError:
-            print("rrdtool graph failed: %s" % (exError.output.decode('utf-8')))
+        # Send the command to the persistent rrdtool process.
+        if queue:
+            return self.queueCommand(strCmd)
+        result, output = self.sendCommand(strCmd)
+        if not result:
+            print("rrdtool graph failed: %s" % output)
             return False
 
         if self.verboseMode:
-            print("rrdtool graph: %s" % result.decode('utf-8')) #, end='')
+            print("rrdtool graph: %s" % output) #, end='')
         return True
 
     ##end def
 ## end class
-